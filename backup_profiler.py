@@ -0,0 +1,281 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+GIB = 1024 ** 3
+SMALL_DATABASE = 1 * GIB  # Below this a plain, uncompressed full dump is fastest to take and restore
+LARGE_DATABASE = 50 * GIB  # From here PostgreSQL dumps switch to the parallel directory format
+MAX_PARALLELISM = 8
+INCREMENTAL_MAX_RATIO = 0.5  # Take a full backup once half of the data has changed since the last one
+DEFAULT_THROUGHPUT = 50 * 1024 * 1024  # Bytes per second per worker, used until there is history
+HISTORY_SAMPLES = 5
+
+# Strategy used when adaptive selection is disabled or profiling fails
+DEFAULT_STRATEGY = {
+    'mode': 'full',
+    'format': 'plain',
+    'compression': 0,
+    'parallelism': 1,
+    'tables': None
+}
+
+
+class DatabaseProfiler:
+    """Collect per-table sizes, row counts, storage ids and write counters over an existing connection"""
+
+    def __init__(self, connection, db_type):
+        self.connection = connection
+        self.db_type = db_type
+
+    def profile(self):
+        if self.db_type == "PostgreSQL":
+            tables = self._postgresql_tables()
+        elif self.db_type == "MySQL":
+            tables = self._mysql_tables()
+        else:
+            raise ValueError(f"Unsupported database type: {self.db_type}")
+        return {
+            'total_bytes': sum(t['bytes'] for t in tables),
+            'total_rows': sum(t['rows'] for t in tables),
+            'tables': tables,
+            'profiled_at': time.time()
+        }
+
+    def _postgresql_tables(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT schemaname, relname, pg_total_relation_size(relid), n_live_tup,
+                       n_tup_ins + n_tup_upd + n_tup_del, pg_relation_filenode(relid)
+                FROM pg_stat_user_tables;
+            """)
+            rows = cursor.fetchall()
+        # TRUNCATE and table rewrites don't move the write counters but give the table a new filenode
+        return [{
+            'schema': row[0],
+            'name': row[1],
+            'bytes': int(row[2] or 0),
+            'rows': int(row[3] or 0),
+            'changes': int(row[4] or 0),
+            'filenode': row[5]
+        } for row in rows]
+
+    def _mysql_tables(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT TABLE_NAME, DATA_LENGTH + INDEX_LENGTH, TABLE_ROWS
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE';
+            """)
+            rows = cursor.fetchall()
+            changes = {}
+            try:
+                # Cumulative since server start; unavailable when performance_schema is off
+                cursor.execute("""
+                    SELECT OBJECT_NAME, COUNT_WRITE
+                    FROM performance_schema.table_io_waits_summary_by_table
+                    WHERE OBJECT_SCHEMA = DATABASE();
+                """)
+                changes = {row[0]: int(row[1]) for row in cursor.fetchall()}
+            except Exception:
+                changes = None
+        return [{
+            'schema': None,
+            'name': row[0],
+            'bytes': int(row[1] or 0),
+            'rows': int(row[2] or 0),
+            'changes': changes.get(row[0], 0) if changes is not None else None,
+            'filenode': None
+        } for row in rows]
+
+
+class BackupHistory:
+    """Past backup runs per target, stored in SQLite"""
+
+    def __init__(self, path='backup_history.db'):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS backups (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    target TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    mode TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    parallelism INTEGER NOT NULL,
+                    compression INTEGER NOT NULL,
+                    bytes_dumped INTEGER NOT NULL,
+                    output_bytes INTEGER,
+                    success INTEGER NOT NULL,
+                    table_snapshot TEXT
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS backups_target ON backups (target, started_at);")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, target, strategy, started_at, duration, bytes_dumped, output_bytes, success, profile=None):
+        """
+        Store a run. bytes_dumped is 0 when the database could not be profiled. Full backups
+        with a profile keep the table snapshot that later incrementals compare against.
+        """
+        snapshot = None
+        if profile is not None and strategy['mode'] == 'full':
+            snapshot = json.dumps({_table_key(t): _table_state(t) for t in profile['tables']})
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO backups (target, started_at, duration, mode, format, parallelism, compression, "
+                "bytes_dumped, output_bytes, success, table_snapshot) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                (target, started_at, duration, strategy['mode'], strategy['format'], strategy['parallelism'],
+                 strategy['compression'], bytes_dumped, output_bytes, int(success), snapshot)
+            )
+
+    def last_full(self, target):
+        """Return the most recent successful full backup of target, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM backups WHERE target = ? AND success = 1 AND mode = 'full' "
+                "ORDER BY started_at DESC LIMIT 1;", (target,)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def recent_runs(self, target, limit=HISTORY_SAMPLES):
+        """Return the most recent successful runs of target, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM backups WHERE target = ? AND success = 1 AND duration > 0 AND bytes_dumped > 0 "
+                "ORDER BY started_at DESC LIMIT ?;", (target, limit)
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+
+def _table_key(table):
+    return f"{table['schema']}.{table['name']}" if table['schema'] else table['name']
+
+
+def _table_state(table):
+    return {key: table[key] for key in ('changes', 'filenode', 'rows', 'bytes')}
+
+
+def changed_tables(profile, last_full):
+    """
+    Return the tables changed since last_full, or None when an incremental backup cannot
+    be trusted (no baseline, no write counters, or tables added or dropped).
+    """
+    if not last_full or not last_full.get('table_snapshot'):
+        return None
+    baseline = json.loads(last_full['table_snapshot'])
+    current = {_table_key(t): _table_state(t) for t in profile['tables']}
+    if set(baseline) != set(current):
+        return None
+    # Snapshots from before storage ids and sizes were kept hold only the write counter
+    if any(not isinstance(state, dict) for state in baseline.values()):
+        return None
+    if any(state['changes'] is None for state in list(baseline.values()) + list(current.values())):
+        return None
+    # Counters that never moved usually mean they are not collected (track_counts = off,
+    # or MySQL table I/O instrumentation disabled), not that nothing was written
+    if not any(state['changes'] for state in list(baseline.values()) + list(current.values())):
+        return None
+
+    # A table counts as changed if its write counter, storage id, row count or size moved.
+    # Counters only go backwards when statistics were reset, so that counts as a change too.
+    tables = {_table_key(t): t for t in profile['tables']}
+    return [tables[key] for key, state in current.items() if state != baseline[key]]
+
+
+def _compression_level(bytes_to_dump):
+    # Larger dumps trade compression ratio for speed
+    if bytes_to_dump < 10 * GIB:
+        return 6
+    if bytes_to_dump < 100 * GIB:
+        return 3
+    return 1
+
+
+def _parallelism(tables, total_bytes):
+    # Parallel workers only help when there are several tables big enough to split the work
+    significant = [t for t in tables if total_bytes and t['bytes'] >= total_bytes * 0.01]
+    return max(2, min(os.cpu_count() or 2, len(significant), MAX_PARALLELISM))
+
+
+def choose_strategy(db_type, profile, last_full=None, full_interval_days=7):
+    """Pick mode, format, compression level and parallelism for a database profile"""
+    total_bytes = profile['total_bytes']
+    mode = 'full'
+    tables = profile['tables']
+
+    if total_bytes >= SMALL_DATABASE and last_full is not None:
+        age = time.time() - last_full['started_at']
+        changed = changed_tables(profile, last_full)
+        if age < timedelta(days=full_interval_days).total_seconds() and changed is not None:
+            changed_bytes = sum(t['bytes'] for t in changed)
+            if changed_bytes <= total_bytes * INCREMENTAL_MAX_RATIO:
+                mode = 'incremental'
+                tables = changed
+
+    bytes_to_dump = sum(t['bytes'] for t in tables)
+    strategy = dict(DEFAULT_STRATEGY, mode=mode, bytes_to_dump=bytes_to_dump)
+    if mode == 'incremental':
+        strategy['tables'] = [_table_key(t) for t in tables]
+
+    if total_bytes < SMALL_DATABASE:
+        return strategy
+
+    strategy['compression'] = _compression_level(bytes_to_dump)
+    if db_type == "PostgreSQL":
+        if bytes_to_dump >= LARGE_DATABASE:
+            strategy['format'] = 'directory'
+            strategy['parallelism'] = _parallelism(tables, bytes_to_dump)
+        else:
+            strategy['format'] = 'custom'
+    else:
+        # mysqldump is single-threaded; its output is compressed while it streams to disk
+        strategy['format'] = 'gzip'
+    return strategy
+
+
+def predict_duration(strategy, runs):
+    """Predict how many seconds a backup with this strategy will take, from past runs"""
+    bytes_to_dump = strategy.get('bytes_to_dump', 0)
+    similar = [r for r in runs if r['format'] == strategy['format']] or runs
+    if similar:
+        # Throughput per worker, so history from a different parallelism still applies
+        per_worker = sum(r['bytes_dumped'] / (r['duration'] * r['parallelism']) for r in similar) / len(similar)
+    else:
+        per_worker = DEFAULT_THROUGHPUT
+    if per_worker <= 0:
+        per_worker = DEFAULT_THROUGHPUT
+    return bytes_to_dump / (per_worker * strategy['parallelism'])
+
+
+def pack_into_window(jobs, window_start, window_end, lanes=1):
+    """
+    Assign start times to (key, predicted_seconds) jobs inside a maintenance window,
+    longest first onto the lane that frees up earliest. Jobs without a prediction go last.
+    Returns ({key: start_datetime}, [keys predicted to overrun the window]).
+    """
+    lanes = max(1, lanes)
+    free_at = [window_start] * lanes
+    plan = {}
+    overrun = []
+    for key, seconds in sorted(jobs, key=lambda job: job[1] if job[1] is not None else -1, reverse=True):
+        lane = min(range(lanes), key=lambda i: free_at[i])
+        start = free_at[lane]
+        plan[key] = start
+        free_at[lane] = start + timedelta(seconds=seconds or 0)
+        if free_at[lane] > window_end:
+            overrun.append(key)
+    return plan, overrun
@@ -1,5 +1,8 @@
 import os
+import re
+import shutil
 import subprocess
+import threading
 import datetime
 import time
 import traceback
@@ -7,36 +10,89 @@ import psycopg2
 import pymysql
 from configparser import ConfigParser
 import platform
+from replica_selector import ReplicaSelector
+from restore_pipeline import (
+    BUFFER_SIZE, MYSQL_FAST_RESTORE_PREFIX, MYSQL_FAST_RESTORE_SUFFIX,
+    run_command, run_piped, run_to_file, run_with_stdin_file
+)
+from backup_profiler import (
+    DEFAULT_STRATEGY, MAX_PARALLELISM, BackupHistory, DatabaseProfiler, choose_strategy, predict_duration
+)
+
+# File extension of each dump format; directory-format dumps are directories
+BACKUP_EXTENSIONS = {
+    'plain': '.sql',
+    'gzip': '.sql.gz',
+    'custom': '.dump',
+    'directory': '.dir'
+}
+PG_DUMP_FORMATS = {'plain': 'p', 'custom': 'c', 'directory': 'd'}
+INCREMENTAL_SUFFIX = '_incr'
+# A data entry in `pg_restore -l` output: "<id>; <oid> <oid> TABLE DATA <schema> <table> <owner>"
+PG_TABLE_DATA_ENTRY = re.compile(r'^\d+; \d+ \d+ TABLE DATA (\S+) (\S+) \S+$')
 
 class DatabaseBackupService:
     def __init__(self):
         self.connection = None
+        # The connection is shared by request threads and scheduler workers, and
+        # neither psycopg2 nor pymysql connections may be used by two threads at once
+        self.connection_lock = threading.RLock()
         self.current_db_type = None
         self.pg_dump_path = None
         self.pg_restore_path = None
+        self.psql_path = None
         self.mysqldump_path = None
         self.mysql_path = None
         self.config = ConfigParser()
         self.config_file = 'config.ini'
+        self.config_mtime = None  # Modification time of the config file when it was last read or written
+        self.active = True  # Whether backups should run against the saved target; cleared by a disconnect
         self.max_backups = 3  # Maximum number of backups to keep
+        self.replicas = []  # Replicas of the current target that backups may be taken from
+        self.replica_selector = ReplicaSelector()
+        self.last_backup_source = None
+        self.fast_restore = False  # Relax constraint checks while restoring MySQL dumps
+        self.restore_buffer_size = BUFFER_SIZE
+        self.adaptive_strategy = True  # Pick format, compression and mode from a profile of the database
+        self.full_interval_days = 7  # Maximum age of the full backup that incrementals build on
+        self.history_path = 'backup_history.db'
         self.load_config()
         self.find_database_tools()
+        self.history = BackupHistory(self.history_path)
 
     def load_config(self):
         if os.path.exists(self.config_file):
             self.config.read(self.config_file)
+            self.config_mtime = os.path.getmtime(self.config_file)
             if 'Database' in self.config:
                 db_config = self.config['Database']
+                self.active = db_config.getboolean('active', True)
                 self.host = db_config.get('host', 'localhost')
                 self.port = db_config.get('port')
                 self.db_name = db_config.get('database')
                 self.user = db_config.get('username')
                 self.password = db_config.get('password')
                 self.current_db_type = db_config.get('db_type')
+            if 'Replicas' in self.config:
+                replica_config = self.config['Replicas']
+                self.replicas = self.parse_replicas(replica_config.get('hosts', ''))
+                self.replica_selector.max_lag = replica_config.getfloat('max_lag', self.replica_selector.max_lag)
+            if 'Restore' in self.config:
+                restore_config = self.config['Restore']
+                self.fast_restore = restore_config.getboolean('fast_restore', self.fast_restore)
+                self.restore_buffer_size = restore_config.getint('buffer_size', self.restore_buffer_size)
+                if self.restore_buffer_size <= 0:
+                    raise ValueError(f"[Restore] buffer_size must be positive, got {self.restore_buffer_size}")
+            if 'Strategy' in self.config:
+                strategy_config = self.config['Strategy']
+                self.adaptive_strategy = strategy_config.getboolean('adaptive', self.adaptive_strategy)
+                self.full_interval_days = strategy_config.getint('full_interval_days', self.full_interval_days)
+                self.history_path = strategy_config.get('history_path', self.history_path)
             if 'Tools' in self.config:
                 tool_config = self.config['Tools']
                 self.pg_dump_path = tool_config.get('pg_dump_path')
                 self.pg_restore_path = tool_config.get('pg_restore_path')
+                self.psql_path = tool_config.get('psql_path')
                 self.mysqldump_path = tool_config.get('mysqldump_path')
                 self.mysql_path = tool_config.get('mysql_path')
 
@@ -50,17 +106,66 @@ class DatabaseBackupService:
         db_config['username'] = self.user
         db_config['password'] = self.password
         db_config['db_type'] = self.current_db_type
+        db_config['active'] = str(self.active)
+
+        if 'Replicas' not in self.config:
+            self.config['Replicas'] = {}
+        replica_config = self.config['Replicas']
+        replica_config['hosts'] = ', '.join(f"{r['host']}:{r['port']}" for r in self.replicas)
+        replica_config['max_lag'] = str(self.replica_selector.max_lag)
+
+        if 'Restore' not in self.config:
+            self.config['Restore'] = {}
+        restore_config = self.config['Restore']
+        restore_config['fast_restore'] = str(self.fast_restore)
+        restore_config['buffer_size'] = str(self.restore_buffer_size)
+
+        if 'Strategy' not in self.config:
+            self.config['Strategy'] = {}
+        strategy_config = self.config['Strategy']
+        strategy_config['adaptive'] = str(self.adaptive_strategy)
+        strategy_config['full_interval_days'] = str(self.full_interval_days)
+        strategy_config['history_path'] = self.history_path
 
         if 'Tools' not in self.config:
             self.config['Tools'] = {}
         tool_config = self.config['Tools']
         tool_config['pg_dump_path'] = self.pg_dump_path if self.pg_dump_path else ''
         tool_config['pg_restore_path'] = self.pg_restore_path if self.pg_restore_path else ''
+        tool_config['psql_path'] = self.psql_path if self.psql_path else ''
         tool_config['mysqldump_path'] = self.mysqldump_path if self.mysqldump_path else ''
         tool_config['mysql_path'] = self.mysql_path if self.mysql_path else ''
 
         with open(self.config_file, 'w') as configfile:
             self.config.write(configfile)
+        self.config_mtime = os.path.getmtime(self.config_file)
+
+    def _connection_settings(self):
+        return tuple(getattr(self, name, None) for name in ('current_db_type', 'host', 'port', 'db_name', 'user', 'password'))
+
+    def reload_config_if_changed(self):
+        """
+        Re-read the config file if another process saved it since this one last did.
+        Follows a disconnect or a change of target there; returns True if the file was reloaded.
+        """
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            return False
+        if mtime == self.config_mtime:
+            return False
+
+        with self.connection_lock:
+            settings = self._connection_settings()
+            self.config = ConfigParser()
+            self.load_config()
+            if not self.active:
+                if self.connection:
+                    self.logout_from_db()
+            elif self._connection_settings() != settings and self.connection:
+                success, message = self.connect_from_config()
+                print(f"Database settings changed in {self.config_file}, reconnecting: {message}")
+        return True
 
     def find_database_tools(self):
         # Simplified for backend service, assuming tools are in PATH or specified manually
@@ -68,6 +173,8 @@ class DatabaseBackupService:
             self.pg_dump_path = self._find_tool('pg_dump')
         if not self.pg_restore_path:
             self.pg_restore_path = self._find_tool('pg_restore')
+        if not self.psql_path:
+            self.psql_path = self._find_tool('psql')
         if not self.mysqldump_path:
             self.mysqldump_path = self._find_tool('mysqldump')
         if not self.mysql_path:
@@ -83,38 +190,103 @@ class DatabaseBackupService:
         except subprocess.CalledProcessError:
             return None
 
-    def connect_to_db(self, db_type, host, port, db_name, user, password):
-        self.current_db_type = db_type
-        self.host = host
-        self.port = port
-        self.db_name = db_name
-        self.user = user
-        self.password = password
+    def parse_replicas(self, replicas, default_port=None):
+        """Normalize replicas given as 'host:port' strings, a comma-separated string or dicts"""
+        if default_port is None:
+            default_port = getattr(self, 'port', None)
+        if not replicas:
+            return []
+        if isinstance(replicas, str):
+            replicas = [r for r in replicas.split(',') if r.strip()]
 
+        parsed = []
+        for replica in replicas:
+            if isinstance(replica, dict):
+                host = replica.get('host')
+                port = replica.get('port') or default_port
+            else:
+                host, _, port = str(replica).strip().rpartition(':')
+                if not host:
+                    host, port = port, default_port
+            if not host:
+                raise ValueError(f"Invalid replica: {replica}")
+            parsed.append({'host': host.strip(), 'port': str(port).strip() if port else default_port})
+        return parsed
+
+    def select_backup_source(self):
+        """Return (host, port, probes) of the server a backup should be dumped from"""
+        if not self.replicas:
+            return self.host, self.port, []
         try:
-            if self.connection:
-                self.connection.close()
-            
-            if db_type == "PostgreSQL":
-                self.connection = psycopg2.connect(
-                    host=host, port=port, database=db_name, user=user, password=password
-                )
-            elif db_type == "MySQL":
-                self.connection = pymysql.connect(
-                    host=host, port=int(port), database=db_name, user=user, password=password
-                )
-            self.connection.autocommit = True
-            return True, "Connection successful."
+            with self.connection_lock:
+                primary_id = self.replica_selector.primary_identity(self.current_db_type, self.connection)
         except Exception as e:
-            self.connection = None
-            return False, f"Connection failed: {e}"
+            # Without the primary's identity no replica can be confirmed to follow it
+            print(f"Could not identify the primary, backing up from it: {e}")
+            return self.host, self.port, []
+        host, port, probes = self.replica_selector.select_source(
+            self.current_db_type, self.replicas, self.db_name, self.user, self.password, primary_id
+        )
+        if host is None:
+            # Only fall back to the primary when no replica is healthy and within the lag bound
+            reasons = '; '.join(f"{p['host']}:{p['port']} {p['reason']}" for p in probes)
+            print(f"No replica available for backup, falling back to primary: {reasons}")
+            return self.host, self.port, probes
+        return host, port, probes
+
+    def connect_to_db(self, db_type, host, port, db_name, user, password, replicas=None):
+        with self.connection_lock:
+            previous_target = self.backup_target()
+            self.current_db_type = db_type
+            self.host = host
+            self.port = port
+            self.db_name = db_name
+            self.user = user
+            self.password = password
+            if replicas is not None:
+                self.replicas = self.parse_replicas(replicas, port)
+            elif self.backup_target() != previous_target:
+                # The saved replicas belong to the previous primary
+                self.replicas = []
+            self.replica_selector.close_all()
+
+            try:
+                if self.connection:
+                    self.connection.close()
+            
+                if db_type == "PostgreSQL":
+                    self.connection = psycopg2.connect(
+                        host=host, port=port, database=db_name, user=user, password=password
+                    )
+                elif db_type == "MySQL":
+                    self.connection = pymysql.connect(
+                        host=host, port=int(port), database=db_name, user=user, password=password
+                    )
+                self.connection.autocommit = True
+                self.active = True
+                return True, "Connection successful."
+            except Exception as e:
+                self.connection = None
+                return False, f"Connection failed: {e}"
+
+    def connect_from_config(self):
+        """Connect using the database settings saved in the config file"""
+        settings = [getattr(self, name, None) for name in ('host', 'port', 'db_name', 'user', 'password')]
+        if not self.current_db_type or not all(settings):
+            return False, "No saved database configuration."
+        if not self.active:
+            return False, "Disconnected; connect again to resume backups."
+        return self.connect_to_db(self.current_db_type, *settings)
 
     def logout_from_db(self):
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            return True, "Logged out successfully."
-        return False, "Not connected."
+        with self.connection_lock:
+            self.replica_selector.close_all()
+            self.active = False
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+                return True, "Logged out successfully."
+            return False, "Not connected."
 
     def get_backup_files(self, backup_location):
         """Get list of backup files sorted by creation time (newest first)"""
@@ -123,32 +295,55 @@ class DatabaseBackupService:
         
         backup_files = []
         for file in os.listdir(backup_location):
-            if file.endswith('.sql'):
+            if self._backup_extension(file):
                 file_path = os.path.join(backup_location, file)
                 file_stat = os.stat(file_path)
                 backup_files.append({
                     'filename': file,
                     'path': file_path,
-                    'size': file_stat.st_size,
-                    'created': file_stat.st_ctime
+                    'size': self._backup_size(file_path),
+                    'created': file_stat.st_ctime,
+                    'mode': 'incremental' if self._is_incremental(file) else 'full'
                 })
         
         # Sort by creation time (newest first)
         backup_files.sort(key=lambda x: x['created'], reverse=True)
         return backup_files
 
+    def _backup_extension(self, path):
+        name = os.path.basename(path.rstrip(os.sep))
+        return next((ext for ext in BACKUP_EXTENSIONS.values() if name.endswith(ext)), None)
+
+    def _is_incremental(self, path):
+        name = os.path.basename(path.rstrip(os.sep))
+        extension = self._backup_extension(name)
+        return bool(extension) and name[:-len(extension)].endswith(INCREMENTAL_SUFFIX)
+
+    def _backup_size(self, path):
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path) for name in names
+        )
+
     def cleanup_old_backups(self, backup_location):
         """Remove old backups if more than max_backups exist"""
         backup_files = self.get_backup_files(backup_location)
         
         if len(backup_files) > self.max_backups:
-            # Remove the oldest backups
+            # Remove the oldest backups, but keep the latest full backup that incrementals build on
             files_to_remove = backup_files[self.max_backups:]
+            latest_full = next((b for b in backup_files if b['mode'] == 'full'), None)
+            files_to_remove = [b for b in files_to_remove if b is not latest_full]
             removed_files = []
             
             for backup in files_to_remove:
                 try:
-                    os.remove(backup['path'])
+                    if os.path.isdir(backup['path']):
+                        shutil.rmtree(backup['path'])
+                    else:
+                        os.remove(backup['path'])
                     removed_files.append(backup['filename'])
                 except Exception as e:
                     print(f"Error removing backup {backup['filename']}: {e}")
@@ -157,89 +352,179 @@ class DatabaseBackupService:
         
         return []
 
-    def create_backup(self, backup_name=None, backup_location='./backups'):
+    def backup_target(self):
+        """Key identifying the current database in the backup history"""
+        host, port, db_name = (getattr(self, name, None) for name in ('host', 'port', 'db_name'))
+        return f"{self.current_db_type}://{host}:{port}/{db_name}"
+
+    def plan_backup(self):
+        """
+        Profile the database and pick a backup strategy and predicted duration for it.
+        Without adaptive selection the strategy is the default full dump of the whole database.
+        """
+        if not self.connection:
+            raise RuntimeError("Not connected to a database.")
+        target = self.backup_target()
+        with self.connection_lock:
+            profile = DatabaseProfiler(self.connection, self.current_db_type).profile()
+        if self.adaptive_strategy:
+            strategy = choose_strategy(
+                self.current_db_type, profile, self.history.last_full(target), self.full_interval_days
+            )
+        else:
+            strategy = dict(DEFAULT_STRATEGY, bytes_to_dump=profile['total_bytes'])
+        predicted = predict_duration(strategy, self.history.recent_runs(target))
+        return {'profile': profile, 'strategy': strategy, 'predicted_seconds': predicted}
+
+    def predict_backup_duration(self):
+        """Predicted duration of the next backup in seconds, or None if it can't be estimated"""
+        if not self.connection:
+            return None
+        try:
+            return self.plan_backup()['predicted_seconds']
+        except Exception as e:
+            print(f"Could not predict backup duration: {e}")
+            return None
+
+    def _pg_table_pattern(self, table_key):
+        # Quote both parts so pg_dump matches the names exactly instead of as patterns
+        schema, _, name = table_key.partition('.')
+        quote = lambda part: '"' + part.replace('"', '""') + '"'
+        return f"{quote(schema)}.{quote(name)}"
+
+    def create_backup(self, backup_name=None, backup_location='./backups', strategy=None):
         if not self.connection:
             return False, "Not connected to a database."
         if not self.current_db_type:
             return False, "Database type not selected."
 
+        profile = None
+        if strategy is None:
+            strategy = dict(DEFAULT_STRATEGY)
+            try:
+                # Profiled even without adaptive selection, so the duration history has sizes to learn from
+                plan = self.plan_backup()
+                profile, strategy = plan['profile'], plan['strategy']
+            except Exception as e:
+                print(f"Database profiling failed, using default backup strategy: {e}")
+
+        if strategy['mode'] == 'incremental' and not strategy['tables']:
+            return True, "No tables changed since the last full backup; backup skipped."
+
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         if backup_name:
             filename = f"{backup_name}_{timestamp}"
         else:
             filename = f"{self.db_name}_{timestamp}"
+        if strategy['mode'] == 'incremental':
+            filename += INCREMENTAL_SUFFIX
 
         os.makedirs(backup_location, exist_ok=True)
         backup_path = os.path.join(backup_location, filename)
 
         try:
+            source_host, source_port, _ = self.select_backup_source()
+            self.last_backup_source = f"{source_host}:{source_port}"
+            started_at = time.time()
             if self.current_db_type == "PostgreSQL":
                 if not self.pg_dump_path:
                     return False, "pg_dump tool not found. Please configure its path."
-                backup_path += ".sql"
+                backup_path += BACKUP_EXTENSIONS[strategy['format']]
                 cmd = [
                     self.pg_dump_path,
-                    "-h", self.host,
-                    "-p", str(self.port),
+                    "-h", source_host,
+                    "-p", str(source_port),
                     "-U", self.user,
-                    "-F", "p", # Plain text SQL dump
+                    "-F", PG_DUMP_FORMATS[strategy['format']],
                     "-d", self.db_name,
                     "-f", backup_path
                 ]
+                if strategy['compression']:
+                    cmd += ["-Z", str(strategy['compression'])]
+                if strategy['format'] == 'directory':
+                    cmd += ["-j", str(strategy['parallelism'])]
+                if strategy['mode'] == 'incremental':
+                    # Data only, so a restore can reload these tables without dropping them
+                    cmd.append("--data-only")
+                for table in strategy['tables'] or []:
+                    cmd += ["-t", self._pg_table_pattern(table)]
                 env = os.environ.copy()
                 env['PGPASSWORD'] = self.password
-                process = subprocess.run(cmd, env=env, capture_output=True, text=True)
+                returncode, stderr = run_command(cmd, env=env)
 
             elif self.current_db_type == "MySQL":
                 if not self.mysqldump_path:
                     return False, "mysqldump tool not found. Please configure its path."
-                backup_path += ".sql"
+                backup_path += BACKUP_EXTENSIONS[strategy['format']]
                 cmd = [
                     self.mysqldump_path,
-                    f"--host={self.host}",
-                    f"--port={self.port}",
+                    f"--host={source_host}",
+                    f"--port={source_port}",
                     f"--user={self.user}",
                     f"--password={self.password}",
                     self.db_name
                 ]
-                with open(backup_path, 'w') as f:
-                    process = subprocess.run(cmd, stdout=f, capture_output=True, text=True)
+                cmd += strategy['tables'] or []
+                returncode, stderr = run_to_file(cmd, backup_path, compresslevel=strategy['compression'])
             else:
                 return False, "Unsupported database type."
 
-            if process.returncode == 0:
+            duration = time.time() - started_at
+            output_bytes = self._backup_size(backup_path) if os.path.exists(backup_path) else None
+            self.history.record(
+                self.backup_target(), strategy, started_at, duration,
+                strategy.get('bytes_to_dump', 0), output_bytes, returncode == 0, profile
+            )
+
+            if returncode == 0:
                 # Cleanup old backups after successful backup
                 removed_files = self.cleanup_old_backups(backup_location)
                 message = f"Backup created successfully at {backup_path}"
+                if source_host != self.host or str(source_port) != str(self.port):
+                    message += f" from replica {self.last_backup_source}"
+                message += f" ({strategy['mode']}, {strategy['format']} format, {duration:.0f}s)"
                 if removed_files:
                     message += f". Removed old backups: {', '.join(removed_files)}"
                 return True, message
             else:
-                return False, f"Backup failed: {process.stderr}"
+                return False, f"Backup failed: {stderr}"
         except Exception as e:
             return False, f"An error occurred during backup: {e}"
 
-    def restore_backup(self, backup_file_path):
+    def restore_backup(self, backup_file_path, fast_restore=None):
         if not self.connection:
             return False, "Not connected to a database."
         if not self.current_db_type:
             return False, "Database type not selected."
+        if fast_restore is None:
+            fast_restore = self.fast_restore
 
         try:
             if self.current_db_type == "PostgreSQL":
-                if not self.pg_restore_path:
-                    return False, "pg_restore tool not found. Please configure its path."
-                cmd = [
-                    self.pg_restore_path,
-                    "-h", self.host,
-                    "-p", str(self.port),
-                    "-U", self.user,
-                    "-d", self.db_name,
-                    backup_file_path
-                ]
                 env = os.environ.copy()
                 env['PGPASSWORD'] = self.password
-                process = subprocess.run(cmd, env=env, capture_output=True, text=True)
+                connection_args = ["-h", self.host, "-p", str(self.port), "-U", self.user, "-d", self.db_name]
+                is_plain = self._backup_extension(backup_file_path) == BACKUP_EXTENSIONS['plain']
+
+                if is_plain or self._is_incremental(backup_file_path):
+                    if not self.psql_path:
+                        return False, "psql tool not found. Please configure its path."
+                if not is_plain and not self.pg_restore_path:
+                    return False, "pg_restore tool not found. Please configure its path."
+
+                if is_plain:
+                    # Plain dumps are SQL scripts, which pg_restore can't read
+                    cmd = [self.psql_path, *connection_args, "-v", "ON_ERROR_STOP=1", "-f", backup_file_path]
+                    returncode, stderr = run_command(cmd, env=env)
+                elif self._is_incremental(backup_file_path):
+                    returncode, stderr = self._restore_pg_incremental(backup_file_path, connection_args, env)
+                else:
+                    cmd = [
+                        self.pg_restore_path, *connection_args,
+                        "-j", str(min(os.cpu_count() or 1, MAX_PARALLELISM)),
+                        backup_file_path
+                    ]
+                    returncode, stderr = run_command(cmd, env=env)
 
             elif self.current_db_type == "MySQL":
                 if not self.mysql_path:
@@ -250,87 +535,158 @@ class DatabaseBackupService:
                     f"--port={self.port}",
                     f"--user={self.user}",
                     f"--password={self.password}",
-                    self.db_name
+                    "--binary-mode"
                 ]
-                with open(backup_file_path, 'r') as f:
-                    process = subprocess.run(cmd, stdin=f, capture_output=True, text=True)
+                prefix = suffix = b''
+                if fast_restore:
+                    prefix, suffix = MYSQL_FAST_RESTORE_PREFIX, MYSQL_FAST_RESTORE_SUFFIX
+                cmd.append(self.db_name)
+                # Stream the dump as raw bytes through fixed-size buffers instead of decoding it
+                returncode, stderr = run_with_stdin_file(
+                    cmd, backup_file_path, prefix=prefix, suffix=suffix,
+                    buffer_size=self.restore_buffer_size
+                )
             else:
                 return False, "Unsupported database type."
 
-            if process.returncode == 0:
+            if returncode == 0:
                 return True, f"Restore successful from {backup_file_path}"
             else:
-                return False, f"Restore failed: {process.stderr}"
+                return False, f"Restore failed: {stderr}"
         except Exception as e:
             return False, f"An error occurred during restore: {e}"
 
+    def _pg_archive_tables(self, archive, env):
+        """List the tables whose data an archive holds, from its table of contents"""
+        process = subprocess.Popen(
+            [self.pg_restore_path, "-l", archive], env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        tables = []
+        for line in process.stdout:
+            if ' TABLE DATA ' not in line:
+                continue
+            match = PG_TABLE_DATA_ENTRY.match(line.strip())
+            if not match:
+                process.kill()
+                process.wait()
+                raise ValueError(f"Can't read table name from archive entry: {line.strip()}")
+            tables.append(f"{match.group(1)}.{match.group(2)}")
+        if process.wait() != 0:
+            raise ValueError(f"Can't list the contents of {archive}")
+        return tables
+
+    def _restore_pg_incremental(self, archive, connection_args, env):
+        """
+        Replace the rows of the tables in a data-only incremental archive, in one transaction.
+        Foreign key triggers are disabled while the old rows are deleted and the new ones
+        loaded, so unchanged tables that reference these tables are left alone; restoring
+        needs a role allowed to set session_replication_role (a superuser).
+        """
+        tables = self._pg_archive_tables(archive, env)
+        if not tables:
+            return 0, ''
+        deletes = ' '.join(f"DELETE FROM {self._pg_table_pattern(table)};" for table in tables)
+        producer = [self.pg_restore_path, "--data-only", "-f", "-", archive]
+        consumer = [
+            self.psql_path, *connection_args, "-v", "ON_ERROR_STOP=1", "--single-transaction",
+            "-c", "SET session_replication_role = replica;",
+            "-c", deletes,
+            "-f", "-"
+        ]
+        return run_piped(producer, consumer, env=env)
+
     def list_users(self):
-        if not self.connection:
-            return False, "Not connected to a database.", []
+        with self.connection_lock:
+            if not self.connection:
+                return False, "Not connected to a database.", []
         
-        users = []
-        try:
-            with self.connection.cursor() as cursor:
-                if self.current_db_type == "PostgreSQL":
-                    cursor.execute("SELECT usename, usesuper, usecreatedb, userepl, usebypassrls FROM pg_user;")
-                    for row in cursor.fetchall():
-                        users.append({
-                            'username': row[0],
-                            'superuser': row[1],
-                            'create_db': row[2],
-                            'replication': row[3],
-                            'bypass_rls': row[4]
-                        })
-                elif self.current_db_type == "MySQL":
-                    cursor.execute("SELECT user, host FROM mysql.user;")
-                    for row in cursor.fetchall():
-                        users.append({'username': f"{row[0]}@{row[1]}"})
-            return True, "Users listed successfully.", users
-        except Exception as e:
-            return False, f"Failed to list users: {e}", []
+            users = []
+            try:
+                with self.connection.cursor() as cursor:
+                    if self.current_db_type == "PostgreSQL":
+                        cursor.execute("SELECT usename, usesuper, usecreatedb, userepl, usebypassrls FROM pg_user;")
+                        for row in cursor.fetchall():
+                            users.append({
+                                'username': row[0],
+                                'superuser': row[1],
+                                'create_db': row[2],
+                                'replication': row[3],
+                                'bypass_rls': row[4]
+                            })
+                    elif self.current_db_type == "MySQL":
+                        cursor.execute("SELECT user, host FROM mysql.user;")
+                        for row in cursor.fetchall():
+                            users.append({'username': f"{row[0]}@{row[1]}"})
+                return True, "Users listed successfully.", users
+            except Exception as e:
+                return False, f"Failed to list users: {e}", []
 
     def execute_user_operation(self, operation, username, password=None, privileges=None):
-        if not self.connection:
-            return False, "Not connected to a database."
+        with self.connection_lock:
+            if not self.connection:
+                return False, "Not connected to a database."
         
-        try:
-            with self.connection.cursor() as cursor:
-                if self.current_db_type == "PostgreSQL":
-                    if operation == "Create User":
-                        create_sql = f"CREATE USER {username} WITH PASSWORD %s;"
-                        cursor.execute(create_sql, (password,))
-                        if privileges:
-                            for priv in privileges:
-                                if priv == 'LOGIN': # LOGIN is default, no need to explicitly grant
-                                    continue
-                                alter_sql = f"ALTER USER {username} {priv};"
-                                cursor.execute(alter_sql)
-                    elif operation == "Delete Users":
-                        delete_sql = f"DROP USER {username};"
-                        cursor.execute(delete_sql)
+            try:
+                with self.connection.cursor() as cursor:
+                    if self.current_db_type == "PostgreSQL":
+                        if operation == "Create User":
+                            create_sql = f"CREATE USER {username} WITH PASSWORD %s;"
+                            cursor.execute(create_sql, (password,))
+                            if privileges:
+                                for priv in privileges:
+                                    if priv == 'LOGIN': # LOGIN is default, no need to explicitly grant
+                                        continue
+                                    alter_sql = f"ALTER USER {username} {priv};"
+                                    cursor.execute(alter_sql)
+                        elif operation == "Delete Users":
+                            delete_sql = f"DROP USER {username};"
+                            cursor.execute(delete_sql)
+                        else:
+                            return False, "Unsupported PostgreSQL user operation."
+                    elif self.current_db_type == "MySQL":
+                        if operation == "Create User":
+                            create_sql = f"CREATE USER %s@'localhost' IDENTIFIED BY %s;"
+                            cursor.execute(create_sql, (username, password))
+                            if privileges:
+                                for priv in privileges:
+                                    grant_sql = f"GRANT {priv} ON *.* TO %s@'localhost';"
+                                    cursor.execute(grant_sql, (username,))
+                        elif operation == "Delete Users":
+                            delete_sql = f"DROP USER %s@'localhost';"
+                            cursor.execute(delete_sql, (username,))
+                        else:
+                            return False, "Unsupported MySQL user operation."
                     else:
-                        return False, "Unsupported PostgreSQL user operation."
-                elif self.current_db_type == "MySQL":
-                    if operation == "Create User":
-                        create_sql = f"CREATE USER %s@'localhost' IDENTIFIED BY %s;"
-                        cursor.execute(create_sql, (username, password))
-                        if privileges:
-                            for priv in privileges:
-                                grant_sql = f"GRANT {priv} ON *.* TO %s@'localhost';"
-                                cursor.execute(grant_sql, (username,))
-                    elif operation == "Delete Users":
-                        delete_sql = f"DROP USER %s@'localhost';"
-                        cursor.execute(delete_sql, (username,))
-                    else:
-                        return False, "Unsupported MySQL user operation."
-                else:
-                    return False, "Unsupported database type for user operations."
+                        return False, "Unsupported database type for user operations."
             
-            self.connection.commit()
-            return True, f"User operation '{operation}' for '{username}' successful."
-        except Exception as e:
-            self.connection.rollback()
-            return False, f"User operation failed: {e}"
+                self.connection.commit()
+                return True, f"User operation '{operation}' for '{username}' successful."
+            except Exception as e:
+                self.connection.rollback()
+                return False, f"User operation failed: {e}"
+
+def parse_flag(value):
+    """Parse a boolean flag from JSON or form input, where 'false' must not count as true"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', '1', 'yes', 'on'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('false', '0', 'no', 'off'):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+# Global service instance shared by every blueprint
+backup_service = None
+
+def get_backup_service():
+    """Get or create the global backup service instance"""
+    global backup_service
+    if backup_service is None:
+        backup_service = DatabaseBackupService()
+    return backup_service
 
 if __name__ == '__main__':
     # Example usage (for testing purposes)
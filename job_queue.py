@@ -0,0 +1,224 @@
+import importlib
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def default_node_id():
+    """Identify this node; processes sharing a node id share its capacity"""
+    return os.environ.get('BACKUP_NODE_ID') or socket.gethostname()
+
+
+class JobStore(ABC):
+    """
+    Interface for persistent job queues shared by several service processes.
+
+    Every job belongs to a (job_name, slot_time) pair that is unique in the store, so
+    however many nodes enqueue the same scheduled slot only one job exists for it.
+    Jobs are handed out under a lease identified by a token; heartbeats extend the
+    lease and only the current lease holder can complete the job. A job whose lease
+    expires (its node died) becomes claimable again until max_attempts is reached,
+    so a slot runs at least once, and more than once only if a node is lost mid-run.
+    """
+
+    @abstractmethod
+    def enqueue(self, job_name, slot_time, payload=None, status=PENDING, max_attempts=3, run_after=None):
+        """Add a job for the slot that may start from run_after; return False if the slot already has one"""
+
+    @abstractmethod
+    def claim(self, node_id, capacity, lease_seconds, now=None):
+        """Lease as many due jobs as node_id has free capacity for and return them"""
+
+    @abstractmethod
+    def heartbeat(self, job_id, lease_token, lease_seconds):
+        """Extend a lease; return False if it has been lost"""
+
+    @abstractmethod
+    def complete(self, job_id, lease_token, success, message=''):
+        """Record the outcome of a leased job; return False if the lease was lost"""
+
+    @abstractmethod
+    def last_slot(self, job_name):
+        """Return the most recent slot_time enqueued for job_name, or None"""
+
+    @abstractmethod
+    def next_pending(self, job_name):
+        """Return the earliest slot_time still waiting to run for job_name, or None"""
+
+    @abstractmethod
+    def list_jobs(self, limit=20):
+        """Return the most recent jobs, newest slot first"""
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job store backed by a SQLite file, shared by every process on one host.
+    WAL mode relies on shared memory, so the file must not live on a network filesystem.
+    """
+
+    def __init__(self, path='jobs.db'):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_name TEXT NOT NULL,
+                    slot_time TEXT NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL,
+                    node_id TEXT,
+                    lease_token TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    message TEXT,
+                    run_after REAL,
+                    UNIQUE (job_name, slot_time)
+                );
+            """)
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(jobs);")]
+            if 'run_after' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL;")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, slot_time);")
+
+    @contextmanager
+    def _connect(self):
+        # A connection per operation keeps the store safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            # Take the write lock up front so concurrent claims cannot interleave
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                yield conn
+                conn.execute("COMMIT;")
+            except Exception:
+                conn.execute("ROLLBACK;")
+                raise
+
+    def enqueue(self, job_name, slot_time, payload=None, status=PENDING, max_attempts=3, run_after=None):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_name, slot_time, payload, status, max_attempts, created_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                (job_name, slot_time, payload, status, max_attempts, time.time(), run_after)
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, node_id, capacity, lease_seconds, now=None):
+        now = time.time() if now is None else now
+        claimed = []
+        with self._transaction() as conn:
+            # Leases that expired were held by a node that stopped heartbeating
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = 'Lease expired after ' || attempts || ' attempt(s)', "
+                "finished_at = ?, lease_token = NULL "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts;",
+                (FAILED, now, RUNNING, now)
+            )
+            in_use = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND node_id = ? AND lease_expires >= ?;",
+                (RUNNING, node_id, now)
+            ).fetchone()[0]
+            free = capacity - in_use
+            if free <= 0:
+                return claimed
+
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE (status = ? AND (run_after IS NULL OR run_after <= ?)) "
+                "OR (status = ? AND lease_expires < ?) ORDER BY slot_time LIMIT ?;",
+                (PENDING, now, RUNNING, now, free)
+            ).fetchall()
+            for row in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET status = ?, node_id = ?, lease_token = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, started_at = ? WHERE id = ?;",
+                    (RUNNING, node_id, token, now + lease_seconds, now, row['id'])
+                )
+                job = dict(row)
+                job.update(status=RUNNING, node_id=node_id, lease_token=token, attempts=row['attempts'] + 1)
+                claimed.append(job)
+        return claimed
+
+    def heartbeat(self, job_id, lease_token, lease_seconds):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_token = ? AND status = ?;",
+                (time.time() + lease_seconds, job_id, lease_token, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, lease_token, success, message=''):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, message = ?, lease_token = NULL "
+                "WHERE id = ? AND lease_token = ? AND status = ?;",
+                (DONE if success else FAILED, time.time(), message, job_id, lease_token, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def last_slot(self, job_name):
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(slot_time) FROM jobs WHERE job_name = ?;", (job_name,)).fetchone()
+            return row[0]
+
+    def next_pending(self, job_name):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MIN(slot_time) FROM jobs WHERE job_name = ? AND status = ?;", (job_name, PENDING)
+            ).fetchone()
+            return row[0]
+
+    def list_jobs(self, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, job_name, slot_time, status, node_id, attempts, run_after, started_at, finished_at, message "
+                "FROM jobs ORDER BY slot_time DESC, id DESC LIMIT ?;", (limit,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+
+def create_job_store(settings):
+    """
+    Build the job store named by the 'store' setting: 'sqlite' (the default), or
+    'package.module:ClassName' for a custom JobStore. Settings prefixed with 'store_'
+    are passed to the custom store's constructor as keyword arguments.
+    """
+    name = settings.get('store', 'sqlite')
+    if name == 'sqlite':
+        return SQLiteJobStore(settings.get('queue_path', 'jobs.db'))
+
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Invalid job store '{name}', expected 'sqlite' or 'package.module:ClassName'")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    options = {key[len('store_'):]: value for key, value in settings.items() if key.startswith('store_')}
+    store = store_class(**options)
+    if not isinstance(store, JobStore):
+        raise ValueError(f"Job store '{name}' does not implement job_queue.JobStore")
+    return store
@@ -0,0 +1,183 @@
+import threading
+import psycopg2
+import pymysql
+import pymysql.cursors
+
+
+class ReplicaSelector:
+    """Pick the replica a backup should be dumped from, based on replication lag and load"""
+
+    def __init__(self, max_lag=30):
+        self.max_lag = max_lag  # Maximum acceptable replication lag in seconds
+        self._pool = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, db_type, host, port, db_name, user, password):
+        if db_type == "PostgreSQL":
+            connection = psycopg2.connect(
+                host=host, port=port, database=db_name, user=user, password=password,
+                connect_timeout=5
+            )
+        elif db_type == "MySQL":
+            connection = pymysql.connect(
+                host=host, port=int(port), database=db_name, user=user, password=password,
+                connect_timeout=5, cursorclass=pymysql.cursors.DictCursor
+            )
+        else:
+            raise ValueError(f"Unsupported database type: {db_type}")
+        connection.autocommit = True
+        return connection
+
+    def _checkout(self, key, db_type, host, port, db_name, user, password):
+        """
+        Take a probe connection out of the pool, or open one if none is idle. A connection
+        is only used by the thread that checked it out; return it with _release.
+        Returns (connection, pooled).
+        """
+        with self._lock:
+            connection = self._pool.pop(key, None)
+        if connection is not None:
+            return connection, True
+        return self._connect(db_type, host, port, db_name, user, password), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            if key not in self._pool:
+                self._pool[key] = connection
+                return
+        # Another thread already returned a connection to the same replica
+        self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close every idle probe connection"""
+        with self._lock:
+            connections = list(self._pool.values())
+            self._pool.clear()
+        for connection in connections:
+            self._close(connection)
+
+    def primary_identity(self, db_type, connection):
+        """Return the identifier a replica of this primary reports for its source"""
+        with connection.cursor() as cursor:
+            if db_type == "PostgreSQL":
+                # Shared by every server of a physical replication cluster
+                cursor.execute("SELECT system_identifier FROM pg_control_system();")
+            elif db_type == "MySQL":
+                cursor.execute("SELECT @@server_uuid;")
+            else:
+                raise ValueError(f"Unsupported database type: {db_type}")
+            row = cursor.fetchone()
+        return str(row[0]) if row and row[0] is not None else None
+
+    def _probe_postgresql(self, connection, primary_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_is_in_recovery();")
+            if not cursor.fetchone()[0]:
+                return None, None, "not in recovery (not a replica)"
+            cursor.execute("SELECT system_identifier FROM pg_control_system();")
+            system_id = str(cursor.fetchone()[0])
+            if system_id != primary_id:
+                return None, None, f"replica of another cluster (system identifier {system_id})"
+            # A replica cut off from the primary has replayed everything it received too,
+            # so lag is only meaningful while the WAL receiver is streaming.
+            cursor.execute("SELECT status FROM pg_stat_wal_receiver;")
+            receiver = cursor.fetchone()
+            cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE state = 'active';")
+            load = cursor.fetchone()[0]
+            if not receiver or receiver[0] != 'streaming':
+                return None, load, "WAL receiver not streaming from the primary"
+            # A streaming replica that has replayed everything it received is not lagging,
+            # even if the primary has been idle and the last replayed transaction is old.
+            cursor.execute("""
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                END;
+            """)
+            lag = cursor.fetchone()[0]
+        if lag is None:
+            return None, load, "replication lag unknown"
+        return float(lag), load, None
+
+    def _probe_mysql(self, connection, primary_id):
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("SHOW REPLICA STATUS;")
+            except pymysql.err.ProgrammingError:
+                # Servers older than 8.0.22 only understand the legacy syntax
+                cursor.execute("SHOW SLAVE STATUS;")
+            channels = cursor.fetchall()
+            cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running';")
+            row = cursor.fetchone()
+            load = int(row['Value']) if row else None
+        if not channels:
+            return None, load, "replication not configured (not a replica)"
+        # With multi-source replication there is one row per channel
+        status = next(
+            (c for c in channels if c.get('Source_UUID', c.get('Master_UUID')) == primary_id), None
+        )
+        if status is None:
+            return None, load, "does not replicate from this primary"
+        sql_running = status.get('Replica_SQL_Running', status.get('Slave_SQL_Running'))
+        if sql_running != 'Yes':
+            return None, load, "replication SQL thread not running"
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        if lag is None:
+            return None, load, "replication lag unknown"
+        return float(lag), load, None
+
+    def probe(self, db_type, replica, db_name, user, password, primary_id):
+        """
+        Probe a single replica of the primary identified by primary_id (see primary_identity)
+        and return its lag, load and whether it may be used
+        """
+        host, port = replica['host'], replica['port']
+        result = {'host': host, 'port': port, 'lag': None, 'load': None, 'usable': False, 'reason': None}
+        key = (db_type, host, str(port), db_name, user)
+        probe = self._probe_postgresql if db_type == "PostgreSQL" else self._probe_mysql
+        while True:
+            connection, pooled = None, False
+            try:
+                connection, pooled = self._checkout(key, db_type, host, port, db_name, user, password)
+                lag, load, reason = probe(connection, primary_id)
+                self._release(key, connection)
+                break
+            except Exception as e:
+                if connection is not None:
+                    self._close(connection)
+                # A pooled connection may have been cut by a replica restart; retry once on a fresh one
+                if not pooled:
+                    result['reason'] = f"probe failed: {e}"
+                    return result
+
+        result['lag'] = lag
+        result['load'] = load
+        if reason:
+            result['reason'] = reason
+        elif lag > self.max_lag:
+            result['reason'] = f"lag {lag:.1f}s exceeds limit of {self.max_lag}s"
+        else:
+            result['usable'] = True
+        return result
+
+    def probe_all(self, db_type, replicas, db_name, user, password, primary_id):
+        """Probe every configured replica"""
+        return [self.probe(db_type, replica, db_name, user, password, primary_id) for replica in replicas]
+
+    def select_source(self, db_type, replicas, db_name, user, password, primary_id):
+        """
+        Return (host, port, probes) for the least-loaded replica within the lag bound.
+        host and port are None when no replica qualifies and the primary must be used.
+        """
+        probes = self.probe_all(db_type, replicas, db_name, user, password, primary_id)
+        candidates = [p for p in probes if p['usable']]
+        if not candidates:
+            return None, None, probes
+        best = min(candidates, key=lambda p: (p['load'] if p['load'] is not None else float('inf'), p['lag']))
+        return best['host'], best['port'], probes
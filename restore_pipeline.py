@@ -0,0 +1,217 @@
+import errno
+import gzip
+import os
+import subprocess
+import tempfile
+
+BUFFER_SIZE = 1024 * 1024  # Fixed size of each chunk moved between the dump and the client
+STDERR_TAIL = 64 * 1024  # Only the end of the client's error output is kept for the message
+
+# Session settings that speed up loading a MySQL dump; they only affect the restore session.
+# The variable names differ from the @OLD_* ones mysqldump's own header saves and overwrites.
+# With autocommit off, rows are committed in one go per table (LOCK TABLES and DDL in the
+# dump commit implicitly) instead of once per INSERT statement.
+MYSQL_FAST_RESTORE_PREFIX = (
+    b"SET @RESTORE_OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0;\n"
+    b"SET @RESTORE_OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0;\n"
+    b"SET @RESTORE_OLD_AUTOCOMMIT=@@AUTOCOMMIT, AUTOCOMMIT=0;\n"
+)
+MYSQL_FAST_RESTORE_SUFFIX = (
+    b"\nCOMMIT;\n"
+    b"SET AUTOCOMMIT=@RESTORE_OLD_AUTOCOMMIT;\n"
+    b"SET UNIQUE_CHECKS=@RESTORE_OLD_UNIQUE_CHECKS;\n"
+    b"SET FOREIGN_KEY_CHECKS=@RESTORE_OLD_FOREIGN_KEY_CHECKS;\n"
+)
+
+_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EXDEV, errno.ENOTSOCK)
+
+
+def _check_buffer_size(buffer_size):
+    # A zero-sized copy reads nothing and would look like an empty dump
+    if buffer_size <= 0:
+        raise ValueError(f"buffer_size must be positive, got {buffer_size}")
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def copy_file_to_fd(src_fd, dst_fd, buffer_size=BUFFER_SIZE):
+    """
+    Copy everything from src_fd to dst_fd without buffering more than buffer_size bytes.
+    Uses splice() or sendfile() so the data stays in the kernel where they are available,
+    and falls back to reading into a single reusable buffer otherwise.
+    """
+    _check_buffer_size(buffer_size)
+    copied = 0
+
+    splice = getattr(os, 'splice', None)
+    if splice is not None:
+        try:
+            while True:
+                count = splice(src_fd, dst_fd, buffer_size)
+                if count == 0:
+                    return copied
+                copied += count
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile is not None:
+        try:
+            while True:
+                count = sendfile(dst_fd, src_fd, copied, buffer_size)
+                if count == 0:
+                    return copied
+                copied += count
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    # sendfile() doesn't move the file offset, so resume from what was copied so far
+    os.lseek(src_fd, copied, os.SEEK_SET)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    while True:
+        count = os.readv(src_fd, [buffer]) if hasattr(os, 'readv') else _read_into(src_fd, view)
+        if count == 0:
+            return copied
+        _write_all(dst_fd, view[:count])
+        copied += count
+
+
+def _read_into(fd, view):
+    data = os.read(fd, len(view))
+    view[:len(data)] = data
+    return len(data)
+
+
+def _copy_stream(src, write, buffer_size=BUFFER_SIZE):
+    """Copy a file object such as a gzip stream to write() through one reusable buffer"""
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+    while True:
+        count = src.readinto(buffer)
+        if not count:
+            return copied
+        write(view[:count])
+        copied += count
+
+
+def _read_tail(file_obj, size=STDERR_TAIL):
+    file_obj.seek(0, os.SEEK_END)
+    length = file_obj.tell()
+    file_obj.seek(max(0, length - size))
+    tail = file_obj.read().decode('utf-8', errors='replace')
+    return tail if length <= size else f"...{tail}"
+
+
+def run_with_stdin_file(cmd, input_path=None, env=None, prefix=b'', suffix=b'', buffer_size=BUFFER_SIZE):
+    """
+    Run cmd, streaming input_path (wrapped in prefix/suffix) into its stdin.
+    Client output is discarded and errors are spooled to a temporary file, so memory
+    use stays constant however large the dump is. Returns (returncode, stderr_tail).
+    """
+    _check_buffer_size(buffer_size)
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            cmd, env=env,
+            stdin=subprocess.PIPE if input_path else subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=stderr_file
+        )
+        try:
+            if input_path:
+                stdin_fd = process.stdin.fileno()
+                try:
+                    if prefix:
+                        _write_all(stdin_fd, prefix)
+                    if input_path.endswith('.gz'):
+                        with gzip.open(input_path, 'rb') as f:
+                            _copy_stream(f, lambda data: _write_all(stdin_fd, data), buffer_size)
+                    else:
+                        with open(input_path, 'rb') as f:
+                            copy_file_to_fd(f.fileno(), stdin_fd, buffer_size)
+                    if suffix:
+                        _write_all(stdin_fd, suffix)
+                except BrokenPipeError:
+                    # The client exited early; its exit code and stderr say why
+                    pass
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+            returncode = process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        return returncode, _read_tail(stderr_file)
+
+
+def run_to_file(cmd, output_path, env=None, compresslevel=0, buffer_size=BUFFER_SIZE):
+    """
+    Run cmd, streaming its stdout into output_path, gzip-compressed when compresslevel is set.
+    Like run_with_stdin_file, memory use is bounded by buffer_size. Returns (returncode, stderr_tail).
+    """
+    _check_buffer_size(buffer_size)
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            if compresslevel:
+                f = gzip.open(output_path, 'wb', compresslevel=compresslevel)
+            else:
+                f = open(output_path, 'wb')
+            with f:
+                _copy_stream(process.stdout, f.write, buffer_size)
+            process.stdout.close()
+            returncode = process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        return returncode, _read_tail(stderr_file)
+
+
+def run_command(cmd, env=None):
+    """
+    Run cmd with no input, discarding its output and keeping only the tail of its errors.
+    Returns (returncode, stderr_tail).
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        returncode = subprocess.run(
+            cmd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr_file
+        ).returncode
+        return returncode, _read_tail(stderr_file)
+
+
+def run_piped(producer_cmd, consumer_cmd, env=None):
+    """
+    Run producer_cmd | consumer_cmd. The data goes through an OS pipe between the two
+    processes and never passes through Python. Returns (returncode, stderr_tail) of the
+    consumer if it failed, otherwise of the producer.
+    """
+    with tempfile.TemporaryFile() as producer_stderr, tempfile.TemporaryFile() as consumer_stderr:
+        producer = subprocess.Popen(producer_cmd, env=env, stdout=subprocess.PIPE, stderr=producer_stderr)
+        try:
+            consumer = subprocess.Popen(
+                consumer_cmd, env=env, stdin=producer.stdout,
+                stdout=subprocess.DEVNULL, stderr=consumer_stderr
+            )
+        except BaseException:
+            producer.kill()
+            producer.wait()
+            raise
+        # The consumer holds its own copy of the read end; closing ours lets the
+        # producer get SIGPIPE if the consumer exits early.
+        producer.stdout.close()
+        consumer_returncode = consumer.wait()
+        producer_returncode = producer.wait()
+        if consumer_returncode != 0:
+            return consumer_returncode, _read_tail(consumer_stderr)
+        return producer_returncode, _read_tail(producer_stderr)
@@ -1,83 +1,260 @@
+import json
+import os
 import threading
-import time
-import schedule
 from datetime import datetime, timedelta
 from backup_service import DatabaseBackupService
+from backup_profiler import pack_into_window
+from job_queue import create_job_store, PENDING, SKIPPED, default_node_id
+
+JOB_NAME = 'scheduled_backup'
+SLOT_FORMAT = "%Y-%m-%d %H:%M:%S"
+CATCH_UP_POLICIES = ('skip', 'latest', 'all')
+
+class WeeklySchedule:
+    def __init__(self, weekday=5, at="00:00"):
+        self.weekday = weekday  # Monday is 0, Saturday is 5
+        self.hour, self.minute = (int(part) for part in at.split(':'))
+
+    def previous_slot(self, moment):
+        """Get the latest slot at or before moment"""
+        slot = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        slot -= timedelta(days=(moment.weekday() - self.weekday) % 7)
+        if slot > moment:
+            slot -= timedelta(days=7)
+        return slot
+
+    def next_slot(self, moment):
+        """Get the first slot strictly after moment"""
+        return self.previous_slot(moment) + timedelta(days=7)
+
+    def slots_between(self, start, end):
+        """Get every slot after start, up to and including end"""
+        slots = []
+        slot = self.next_slot(start)
+        while slot <= end:
+            slots.append(slot)
+            slot += timedelta(days=7)
+        return slots
 
 class BackupScheduler:
-    def __init__(self, backup_service):
+    def __init__(self, backup_service, store=None):
         self.backup_service = backup_service
         self.scheduler_thread = None
         self.running = False
+        self._pid = None
+        self._stop_event = threading.Event()
+        self._workers = []
+        self.load_settings()
+        self.store = store if store is not None else create_job_store(self.store_settings)
         self.setup_schedule()
 
+    def load_settings(self):
+        """Read scheduler settings from the [Scheduler] section of the service config"""
+        config = self.backup_service.config
+        section = config['Scheduler'] if 'Scheduler' in config else {}
+        capacity = int(section.get('capacity', 1))  # Concurrent backups per node
+        lease_seconds = int(section.get('lease_seconds', 300))
+        poll_interval = int(section.get('poll_interval', 30))
+        misfire_grace = int(section.get('misfire_grace', 3600))
+        catch_up = section.get('catch_up', 'latest')
+        window_hours = float(section.get('window_hours', 6))  # Maintenance window starting at each slot
+        for name, value in (('capacity', capacity), ('lease_seconds', lease_seconds),
+                            ('poll_interval', poll_interval), ('window_hours', window_hours)):
+            # Zero would disable the node or spin the heartbeat and poll loops
+            if value <= 0:
+                raise ValueError(f"[Scheduler] {name} must be positive, got {value}")
+        if misfire_grace < 0:
+            raise ValueError(f"[Scheduler] misfire_grace must not be negative, got {misfire_grace}")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch_up policy '{catch_up}', expected one of {CATCH_UP_POLICIES}")
+
+        self.store_settings = dict(section)
+        self.node_id = section.get('node_id') or default_node_id()
+        self.capacity = capacity
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.misfire_grace = misfire_grace
+        self.catch_up = catch_up
+        self.window_hours = window_hours
+        self.settings_mtime = self.backup_service.config_mtime
+
     def setup_schedule(self):
         """Setup the backup schedule for every Saturday at midnight"""
-        schedule.clear()
-        schedule.every().saturday.at("00:00").do(self.run_scheduled_backup)
+        self.schedule = WeeklySchedule(weekday=5, at="00:00")
+        self.payload = json.dumps({'backup_location': './backups'})
+
+    def enqueue_due_slots(self, now=None):
+        """Add due slots to the queue, applying the catch-up policy to slots missed while down"""
+        now = now or datetime.now()
+        last = self.store.last_slot(JOB_NAME)
+        if last is None:
+            # First start against this queue: record the latest slot so that later downtime
+            # can be detected, but don't run a backup for a slot nobody scheduled.
+            anchor = self.schedule.previous_slot(now)
+            self.store.enqueue(JOB_NAME, anchor.strftime(SLOT_FORMAT), self.payload, status=SKIPPED)
+            return
 
-    def run_scheduled_backup(self):
+        due = self.schedule.slots_between(datetime.strptime(last, SLOT_FORMAT), now)
+        if not due:
+            return
+
+        if self.catch_up == 'all':
+            run = due
+        elif self.catch_up == 'latest':
+            run = due[-1:]
+        else:
+            # 'skip' only runs a slot that is still within the misfire grace period
+            run = [slot for slot in due[-1:] if (now - slot).total_seconds() <= self.misfire_grace]
+
+        plan = self.plan_window(run, now)
+        for slot in due:
+            status = PENDING if slot in run else SKIPPED
+            run_after = plan[slot].timestamp() if slot in plan else None
+            if self.store.enqueue(JOB_NAME, slot.strftime(SLOT_FORMAT), self.payload, status=status, run_after=run_after):
+                print(f"[{datetime.now()}] Queued {JOB_NAME} for {slot} ({status})")
+
+    def plan_window(self, slots, now=None):
+        """Pack the backups for slots into the maintenance window using predicted durations"""
+        if not slots:
+            return {}
+        now = now or datetime.now()
+        predicted = self.backup_service.predict_backup_duration()
+        window_start = max(slots[0], now)
+        window_end = slots[-1] + timedelta(hours=self.window_hours)
+        plan, overrun = pack_into_window([(slot, predicted) for slot in slots], window_start, window_end, self.capacity)
+        for slot in overrun:
+            print(f"[{datetime.now()}] Backup for {slot} is predicted to overrun the maintenance window "
+                  f"ending {window_end} (predicted duration: {predicted or 0:.0f}s)")
+        return plan
+
+    def run_scheduled_backup(self, backup_location="./backups", backup_name="scheduled_backup"):
         """Execute the scheduled backup"""
         print(f"[{datetime.now()}] Running scheduled backup...")
-        
+
         if not self.backup_service.connection:
             print("No database connection available for scheduled backup")
-            return
-        
+            return False, "No database connection available for scheduled backup"
+
         try:
-            # Use default backup location
-            backup_location = "./backups"
             success, message = self.backup_service.create_backup(
-                backup_name="scheduled_backup", 
+                backup_name=backup_name,
                 backup_location=backup_location
             )
-            
+
             if success:
                 print(f"[{datetime.now()}] Scheduled backup completed successfully: {message}")
             else:
                 print(f"[{datetime.now()}] Scheduled backup failed: {message}")
-                
+            return success, message
+
         except Exception as e:
             print(f"[{datetime.now()}] Error during scheduled backup: {e}")
+            return False, f"Error during scheduled backup: {e}"
+
+    def _run_job(self, job):
+        """Run a leased job, heartbeating until it finishes"""
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    renewed = self.store.heartbeat(job['id'], job['lease_token'], self.lease_seconds)
+                except Exception as e:
+                    # e.g. the store is briefly locked; the lease has time left, so retry next beat
+                    print(f"[{datetime.now()}] Heartbeat for job {job['id']} failed, retrying: {e}")
+                    continue
+                if not renewed:
+                    print(f"[{datetime.now()}] Lost lease on job {job['id']} for slot {job['slot_time']}")
+                    return
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            payload = json.loads(job['payload'] or '{}')
+            # Name the file after the slot so concurrent jobs never write to the same path
+            slot = datetime.strptime(job['slot_time'], SLOT_FORMAT)
+            success, message = self.run_scheduled_backup(
+                payload.get('backup_location', './backups'),
+                backup_name=f"{JOB_NAME}_{slot.strftime('%Y%m%d_%H%M')}"
+            )
+        except Exception as e:
+            success, message = False, f"Error during scheduled backup: {e}"
+        finally:
+            done.set()
+
+        if not self.store.complete(job['id'], job['lease_token'], success, message):
+            print(f"[{datetime.now()}] Job {job['id']} finished after its lease was lost; result not recorded")
+
+    def run_pending(self):
+        """Enqueue due slots and start any jobs this node has capacity for"""
+        # Another worker may have switched the target, changed settings or disconnected
+        self.backup_service.reload_config_if_changed()
+        if self.backup_service.config_mtime != self.settings_mtime:
+            self.load_settings()
+        if not self.backup_service.connection:
+            # Retry the saved connection, e.g. if the database was down when this node started
+            success, _ = self.backup_service.connect_from_config()
+            if not success:
+                # A node without a connection can't run backups, so leave the work to the others
+                return []
+
+        self.enqueue_due_slots()
+
+        jobs = self.store.claim(self.node_id, self.capacity, self.lease_seconds)
+        for job in jobs:
+            worker = threading.Thread(target=self._run_job, args=(job,), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        return jobs
 
     def start_scheduler(self):
         """Start the background scheduler thread"""
-        if self.running:
+        if self.is_running():
             return False, "Scheduler is already running"
-        
+
         self.running = True
+        self._pid = os.getpid()
+        self._stop_event.clear()
         self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.scheduler_thread.start()
-        
+
         return True, "Backup scheduler started successfully"
 
     def stop_scheduler(self):
         """Stop the background scheduler"""
-        if not self.running:
+        if not self.is_running():
             return False, "Scheduler is not running"
-        
+
         self.running = False
-        schedule.clear()
-        
+        self._stop_event.set()
+
         return True, "Backup scheduler stopped successfully"
 
     def _run_scheduler(self):
         """Internal method to run the scheduler loop"""
         while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"[{datetime.now()}] Error polling job queue: {e}")
+            self._stop_event.wait(self.poll_interval)
 
     def get_next_backup_time(self):
         """Get the next scheduled backup time"""
-        jobs = schedule.get_jobs()
-        if jobs:
-            next_run = jobs[0].next_run
-            return next_run.strftime("%Y-%m-%d %H:%M:%S")
-        return "No scheduled backups"
+        pending = self.store.next_pending(JOB_NAME)
+        if pending:
+            return pending
+        return self.schedule.next_slot(datetime.now()).strftime(SLOT_FORMAT)
+
+    def get_jobs(self, limit=20):
+        """Get the most recent jobs from the queue"""
+        return self.store.list_jobs(limit)
 
     def is_running(self):
         """Check if scheduler is running"""
-        return self.running
+        # A forked child inherits the flag but not the thread
+        return self.running and self._pid == os.getpid()
 
     def force_backup_now(self):
         """Force a backup to run immediately (for testing)"""
@@ -86,10 +263,9 @@ class BackupScheduler:
 # Global scheduler instance
 scheduler = None
 
-def get_scheduler(backup_service):
+def get_scheduler(backup_service, store=None):
     """Get or create the global scheduler instance"""
     global scheduler
     if scheduler is None:
-        scheduler = BackupScheduler(backup_service)
+        scheduler = BackupScheduler(backup_service, store)
     return scheduler
-
@@ -2,11 +2,14 @@ import os
 import sys
 import platform
 import subprocess
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from backup_service import get_backup_service
+from scheduler import get_scheduler
 from src.routes.backup import backup_bp
 from src.routes.config import config_bp
 
@@ -19,6 +22,29 @@ CORS(app)
 app.register_blueprint(backup_bp, url_prefix='/api')
 app.register_blueprint(config_bp, url_prefix='/api')
 
+_scheduler_lock = threading.Lock()
+_scheduler_pid = None
+
+def start_background_scheduler():
+    """Reconnect with the saved configuration and start this process's scheduler, once per process"""
+    global _scheduler_pid
+    with _scheduler_lock:
+        # Checked by pid because a forked worker inherits this module's state but not its threads
+        if _scheduler_pid == os.getpid():
+            return
+        _scheduler_pid = os.getpid()
+    backup_service = get_backup_service()
+    success, message = backup_service.connect_from_config()
+    print(f"Startup connection: {message}")
+    # Runs even without a connection; the scheduler keeps retrying the saved settings
+    get_scheduler(backup_service).start_scheduler()
+
+@app.before_request
+def sync_with_other_workers():
+    """Pick up settings other workers saved, and start the scheduler if no server hook has"""
+    get_backup_service().reload_config_if_changed()
+    start_background_scheduler()
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -37,5 +63,7 @@ def serve(path):
 
 
 if __name__ == '__main__':
+    # With the debug reloader, only the child process that serves requests runs backups
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_scheduler()
     app.run(host='0.0.0.0', port=5002, debug=True)
-
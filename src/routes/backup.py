@@ -2,13 +2,13 @@ from flask import Blueprint, request, jsonify
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from backup_service import DatabaseBackupService
+from backup_service import get_backup_service, parse_flag
 from scheduler import get_scheduler
 
 backup_bp = Blueprint('backup', __name__)
 
-# Global service instance
-backup_service = DatabaseBackupService()
+# Global service instance, shared with the other blueprints
+backup_service = get_backup_service()
 
 @backup_bp.route('/connect', methods=['POST'])
 def connect():
@@ -19,10 +19,16 @@ def connect():
     if not all(field in data for field in required_fields):
         return jsonify({'success': False, 'message': 'Missing required fields'}), 400
     
-    success, message = backup_service.connect_to_db(
-        data['db_type'], data['host'], data['port'], 
-        data['database'], data['username'], data['password']
-    )
+    try:
+        if 'max_replica_lag' in data:
+            backup_service.replica_selector.max_lag = float(data['max_replica_lag'])
+        success, message = backup_service.connect_to_db(
+            data['db_type'], data['host'], data['port'], 
+            data['database'], data['username'], data['password'],
+            replicas=data.get('replicas')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     if success:
         backup_service.save_config()
@@ -36,6 +42,9 @@ def connect():
 def disconnect():
     """Disconnect from database"""
     success, message = backup_service.logout_from_db()
+    if backup_service.current_db_type:
+        # Saved so that the other workers disconnect as well
+        backup_service.save_config()
     
     # Stop scheduler when disconnecting
     if success:
@@ -64,6 +73,22 @@ def status():
         'next_backup': next_backup
     })
 
+@backup_bp.route('/replicas', methods=['GET'])
+def list_replicas():
+    """Probe configured replicas and report which one the next backup would use"""
+    if not backup_service.connection:
+        return jsonify({'success': False, 'message': 'Not connected to a database.', 'replicas': []})
+
+    host, port, probes = backup_service.select_backup_source()
+    
+    return jsonify({
+        'success': True,
+        'max_lag': backup_service.replica_selector.max_lag,
+        'replicas': probes,
+        'backup_source': f"{host}:{port}",
+        'using_primary': host == backup_service.host and str(port) == str(backup_service.port)
+    })
+
 @backup_bp.route('/backup', methods=['POST'])
 def create_backup():
     """Create a database backup"""
@@ -76,6 +101,32 @@ def create_backup():
     
     return jsonify({'success': success, 'message': message})
 
+@backup_bp.route('/backup/plan', methods=['GET'])
+def backup_plan():
+    """Profile the database and show the strategy and predicted duration of the next backup"""
+    if not backup_service.connection:
+        return jsonify({'success': False, 'message': 'Not connected to a database.'})
+    
+    try:
+        plan = backup_service.plan_backup()
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error profiling database: {e}'})
+    
+    profile = plan['profile']
+    largest = sorted(profile['tables'], key=lambda t: t['bytes'], reverse=True)[:10]
+    return jsonify({
+        'success': True,
+        'adaptive': backup_service.adaptive_strategy,
+        'strategy': plan['strategy'],
+        'predicted_seconds': round(plan['predicted_seconds'], 1),
+        'profile': {
+            'total_bytes': profile['total_bytes'],
+            'total_rows': profile['total_rows'],
+            'table_count': len(profile['tables']),
+            'largest_tables': largest
+        }
+    })
+
 @backup_bp.route('/backup/force', methods=['POST'])
 def force_backup():
     """Force a scheduled backup to run immediately"""
@@ -95,7 +146,14 @@ def restore_backup():
     if 'backup_file_path' not in data:
         return jsonify({'success': False, 'message': 'backup_file_path is required'}), 400
     
-    success, message = backup_service.restore_backup(data['backup_file_path'])
+    fast_restore = None
+    if data.get('fast_restore') is not None:
+        try:
+            fast_restore = parse_flag(data['fast_restore'])
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'fast_restore: {e}'}), 400
+    
+    success, message = backup_service.restore_backup(data['backup_file_path'], fast_restore)
     
     return jsonify({'success': success, 'message': message})
 
@@ -137,6 +195,18 @@ def scheduler_status():
         'next_backup': scheduler.get_next_backup_time()
     })
 
+@backup_bp.route('/scheduler/jobs', methods=['GET'])
+def scheduler_jobs():
+    """List recent jobs from the persistent job queue"""
+    scheduler = get_scheduler(backup_service)
+    limit = request.args.get('limit', 20, type=int)
+    
+    return jsonify({
+        'success': True,
+        'node_id': scheduler.node_id,
+        'jobs': scheduler.get_jobs(limit)
+    })
+
 @backup_bp.route('/users', methods=['GET'])
 def list_users():
     """List database users"""
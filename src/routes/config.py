@@ -2,12 +2,12 @@ from flask import Blueprint, request, jsonify
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from backup_service import DatabaseBackupService
+from backup_service import get_backup_service, parse_flag
 
 config_bp = Blueprint('config', __name__)
 
-# Global service instance
-backup_service = DatabaseBackupService()
+# Global service instance, shared with the other blueprints
+backup_service = get_backup_service()
 
 @config_bp.route('/config', methods=['GET'])
 def get_config():
@@ -20,8 +20,13 @@ def get_config():
         'db_type': getattr(backup_service, 'current_db_type', ''),
         'pg_dump_path': backup_service.pg_dump_path or '',
         'pg_restore_path': backup_service.pg_restore_path or '',
+        'psql_path': backup_service.psql_path or '',
         'mysqldump_path': backup_service.mysqldump_path or '',
-        'mysql_path': backup_service.mysql_path or ''
+        'mysql_path': backup_service.mysql_path or '',
+        'replicas': [f"{r['host']}:{r['port']}" for r in backup_service.replicas],
+        'max_replica_lag': backup_service.replica_selector.max_lag,
+        'adaptive_strategy': backup_service.adaptive_strategy,
+        'full_interval_days': backup_service.full_interval_days
     }
     
     return jsonify({'success': True, 'config': config_data})
@@ -32,6 +37,7 @@ def save_config():
     data = request.get_json()
     
     # Update service configuration
+    previous_target = backup_service.backup_target()
     if 'host' in data:
         backup_service.host = data['host']
     if 'port' in data:
@@ -48,10 +54,26 @@ def save_config():
         backup_service.pg_dump_path = data['pg_dump_path']
     if 'pg_restore_path' in data:
         backup_service.pg_restore_path = data['pg_restore_path']
+    if 'psql_path' in data:
+        backup_service.psql_path = data['psql_path']
     if 'mysqldump_path' in data:
         backup_service.mysqldump_path = data['mysqldump_path']
     if 'mysql_path' in data:
         backup_service.mysql_path = data['mysql_path']
+    try:
+        if 'adaptive_strategy' in data:
+            backup_service.adaptive_strategy = parse_flag(data['adaptive_strategy'])
+        if 'replicas' in data:
+            backup_service.replicas = backup_service.parse_replicas(data['replicas'])
+        elif backup_service.backup_target() != previous_target:
+            # The saved replicas belong to the previous primary
+            backup_service.replicas = []
+        if 'max_replica_lag' in data:
+            backup_service.replica_selector.max_lag = float(data['max_replica_lag'])
+        if 'full_interval_days' in data:
+            backup_service.full_interval_days = int(data['full_interval_days'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
     # Save to file
     backup_service.save_config()
@@ -66,6 +88,7 @@ def detect_tools():
     tools = {
         'pg_dump_path': backup_service.pg_dump_path or 'Not found',
         'pg_restore_path': backup_service.pg_restore_path or 'Not found',
+        'psql_path': backup_service.psql_path or 'Not found',
         'mysqldump_path': backup_service.mysqldump_path or 'Not found',
         'mysql_path': backup_service.mysql_path or 'Not found'
     }
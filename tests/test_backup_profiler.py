@@ -0,0 +1,119 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from backup_profiler import (
+    DEFAULT_STRATEGY, GIB, BackupHistory, changed_tables, choose_strategy, pack_into_window, predict_duration
+)
+
+
+def table(name, size=GIB, rows=1000, changes=10, filenode=1):
+    return {'schema': 'public', 'name': name, 'bytes': size, 'rows': rows, 'changes': changes, 'filenode': filenode}
+
+
+def profile(*tables):
+    return {
+        'total_bytes': sum(t['bytes'] for t in tables),
+        'total_rows': sum(t['rows'] for t in tables),
+        'tables': list(tables)
+    }
+
+
+@pytest.fixture
+def history(tmp_path):
+    return BackupHistory(str(tmp_path / 'history.db'))
+
+
+def last_full(history, baseline, target='pg://db'):
+    history.record(target, dict(DEFAULT_STRATEGY), time.time(), 10, baseline['total_bytes'], None, True, baseline)
+    return history.last_full(target)
+
+
+def test_changed_tables_detects_writes(history):
+    full = last_full(history, profile(table('a'), table('b')))
+    changed = changed_tables(profile(table('a', changes=11), table('b')), full)
+    assert [t['name'] for t in changed] == ['a']
+
+
+def test_changed_tables_detects_truncate_by_filenode(history):
+    full = last_full(history, profile(table('a'), table('b')))
+    # TRUNCATE leaves the write counters alone
+    changed = changed_tables(profile(table('a'), table('b', rows=0, size=8192, filenode=2)), full)
+    assert [t['name'] for t in changed] == ['b']
+
+
+def test_changed_tables_is_empty_when_nothing_moved(history):
+    full = last_full(history, profile(table('a'), table('b')))
+    assert changed_tables(profile(table('a'), table('b')), full) == []
+
+
+def test_zero_counters_are_not_trusted(history):
+    full = last_full(history, profile(table('a', changes=0), table('b', changes=0)))
+    assert changed_tables(profile(table('a', changes=0), table('b', changes=0)), full) is None
+
+
+def test_missing_counters_or_schema_changes_are_not_trusted(history):
+    full = last_full(history, profile(table('a'), table('b')))
+    assert changed_tables(profile(table('a'), table('b', changes=None)), full) is None
+    assert changed_tables(profile(table('a')), full) is None
+    assert changed_tables(profile(table('a')), None) is None
+
+
+def test_counter_only_snapshots_are_not_trusted():
+    assert changed_tables(profile(table('a')), {'table_snapshot': '{"public.a": 10}'}) is None
+
+
+def test_small_database_gets_plain_full_dump():
+    strategy = choose_strategy("PostgreSQL", profile(table('a', size=1024)))
+    assert (strategy['mode'], strategy['format'], strategy['compression']) == ('full', 'plain', 0)
+
+
+def test_formats_by_size():
+    assert choose_strategy("PostgreSQL", profile(table('a', size=5 * GIB)))['format'] == 'custom'
+    assert choose_strategy("PostgreSQL", profile(table('a', size=60 * GIB)))['format'] == 'directory'
+    assert choose_strategy("MySQL", profile(table('a', size=5 * GIB)))['format'] == 'gzip'
+
+
+def test_incremental_when_few_tables_changed(history):
+    full = last_full(history, profile(table('a'), table('b', size=4 * GIB)))
+    strategy = choose_strategy("PostgreSQL", profile(table('a', changes=20), table('b', size=4 * GIB)), full)
+    assert strategy['mode'] == 'incremental'
+    assert strategy['tables'] == ['public.a']
+    assert strategy['bytes_to_dump'] == GIB
+
+
+def test_full_when_counters_are_untrustworthy(history):
+    baseline = profile(table('a', changes=0), table('b', size=4 * GIB, changes=0))
+    full = last_full(history, baseline)
+    assert choose_strategy("PostgreSQL", baseline, full)['mode'] == 'full'
+
+
+def test_full_when_last_full_is_too_old(history):
+    baseline = profile(table('a'), table('b', size=4 * GIB))
+    full = last_full(history, baseline)
+    full['started_at'] -= timedelta(days=8).total_seconds()
+    current = profile(table('a', changes=20), table('b', size=4 * GIB))
+    assert choose_strategy("PostgreSQL", current, full, full_interval_days=7)['mode'] == 'full'
+
+
+def test_runs_without_a_profile_are_recorded(history):
+    history.record('pg://db', dict(DEFAULT_STRATEGY), time.time(), 10, 0, 100, True)
+    history.record('pg://db', dict(DEFAULT_STRATEGY), time.time(), 10, 1000, 100, True)
+    assert [run['bytes_dumped'] for run in history.recent_runs('pg://db')] == [1000]
+    assert history.last_full('pg://db')['table_snapshot'] is None
+
+
+def test_predict_duration_uses_history_throughput():
+    runs = [{'format': 'custom', 'bytes_dumped': 1000, 'duration': 10, 'parallelism': 1}]
+    strategy = dict(DEFAULT_STRATEGY, format='custom', parallelism=2, bytes_to_dump=2000)
+    assert predict_duration(strategy, runs) == pytest.approx(10)
+
+
+def test_pack_into_window():
+    start = datetime(2026, 10, 17)
+    plan, overrun = pack_into_window([('a', 3600), ('b', 7200), ('c', 3600)], start, start + timedelta(hours=2), lanes=2)
+    # Longest first, each onto the lane that frees up earliest
+    assert plan == {'b': start, 'a': start, 'c': start + timedelta(hours=1)}
+    assert overrun == []
+    plan, overrun = pack_into_window([('a', 3600), ('b', 7200)], start, start + timedelta(hours=2), lanes=1)
+    assert overrun == ['a']
@@ -0,0 +1,94 @@
+import pytest
+from job_queue import DONE, FAILED, PENDING, RUNNING, SKIPPED, JobStore, SQLiteJobStore, create_job_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+
+
+def test_enqueue_keeps_one_job_per_slot(store):
+    assert store.enqueue('backup', '2026-10-17 00:00:00')
+    assert not store.enqueue('backup', '2026-10-17 00:00:00')
+    assert len(store.list_jobs()) == 1
+    assert store.last_slot('backup') == '2026-10-17 00:00:00'
+
+
+def test_claim_respects_capacity(store):
+    for day in ('03', '10', '17'):
+        store.enqueue('backup', f'2026-10-{day} 00:00:00')
+    first = store.claim('node-a', capacity=2, lease_seconds=60, now=1000)
+    assert [job['slot_time'] for job in first] == ['2026-10-03 00:00:00', '2026-10-10 00:00:00']
+    assert store.claim('node-a', capacity=2, lease_seconds=60, now=1001) == []
+    # Capacity is per node
+    assert len(store.claim('node-b', capacity=2, lease_seconds=60, now=1001)) == 1
+
+
+def test_claim_waits_for_run_after(store):
+    store.enqueue('backup', '2026-10-17 00:00:00', run_after=2000)
+    assert store.claim('node-a', 1, 60, now=1999) == []
+    assert len(store.claim('node-a', 1, 60, now=2000)) == 1
+
+
+def test_skipped_jobs_are_never_claimed(store):
+    store.enqueue('backup', '2026-10-17 00:00:00', status=SKIPPED)
+    assert store.claim('node-a', 1, 60, now=1000) == []
+
+
+def test_expired_lease_is_reclaimed_and_fences_the_old_holder(store):
+    store.enqueue('backup', '2026-10-17 00:00:00')
+    [lost] = store.claim('node-a', 1, lease_seconds=60, now=1000)
+    assert store.claim('node-b', 1, lease_seconds=60, now=1059) == []
+
+    [retry] = store.claim('node-b', 1, lease_seconds=60, now=1061)
+    assert retry['id'] == lost['id']
+    assert retry['attempts'] == 2
+    assert not store.heartbeat(lost['id'], lost['lease_token'], 60)
+    assert not store.complete(lost['id'], lost['lease_token'], True)
+    assert store.complete(retry['id'], retry['lease_token'], True, 'ok')
+    assert store.list_jobs()[0]['status'] == DONE
+
+
+def test_job_fails_after_max_attempts(store):
+    store.enqueue('backup', '2026-10-17 00:00:00', max_attempts=2)
+    now = 1000
+    for _ in range(2):
+        assert len(store.claim('node-a', 1, lease_seconds=60, now=now)) == 1
+        now += 61
+    assert store.claim('node-a', 1, lease_seconds=60, now=now) == []
+    job = store.list_jobs()[0]
+    assert job['status'] == FAILED
+    assert 'Lease expired' in job['message']
+
+
+def test_heartbeat_and_complete(store):
+    store.enqueue('backup', '2026-10-17 00:00:00')
+    [job] = store.claim('node-a', 1, 60)
+    assert store.list_jobs()[0]['status'] == RUNNING
+    assert store.heartbeat(job['id'], job['lease_token'], 60)
+    assert store.complete(job['id'], job['lease_token'], False, 'dump failed')
+    assert store.list_jobs()[0]['status'] == FAILED
+    assert store.next_pending('backup') is None
+
+
+def test_next_pending(store):
+    store.enqueue('backup', '2026-10-10 00:00:00', status=SKIPPED)
+    store.enqueue('backup', '2026-10-17 00:00:00', status=PENDING)
+    assert store.next_pending('backup') == '2026-10-17 00:00:00'
+
+
+class IncompleteStore(JobStore):
+    def enqueue(self, job_name, slot_time, payload=None, status=PENDING, max_attempts=3, run_after=None):
+        return True
+
+
+def test_incomplete_store_fails_when_constructed():
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+def test_create_job_store(tmp_path):
+    store = create_job_store({'queue_path': str(tmp_path / 'queue.db')})
+    assert isinstance(store, SQLiteJobStore)
+    with pytest.raises(ValueError):
+        create_job_store({'store': 'not-a-store'})
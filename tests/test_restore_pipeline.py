@@ -0,0 +1,92 @@
+import errno
+import gzip
+import os
+import sys
+
+import pytest
+from restore_pipeline import STDERR_TAIL, copy_file_to_fd, run_to_file, run_with_stdin_file
+
+DATA = os.urandom(300 * 1024)
+
+
+def copy_through_pipe(tmp_path, buffer_size=64 * 1024):
+    source = tmp_path / 'dump.sql'
+    source.write_bytes(DATA)
+    target = tmp_path / 'copy.sql'
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        copied = copy_file_to_fd(src.fileno(), dst.fileno(), buffer_size)
+    return copied, target.read_bytes()
+
+
+def unsupported(*args):
+    raise OSError(errno.EINVAL, "not supported")
+
+
+def test_copy_file_to_fd(tmp_path):
+    assert copy_through_pipe(tmp_path) == (len(DATA), DATA)
+
+
+def test_copy_file_to_fd_falls_back_to_a_buffer(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, 'splice', unsupported, raising=False)
+    monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    assert copy_through_pipe(tmp_path) == (len(DATA), DATA)
+
+
+def test_copy_file_to_fd_resumes_after_partial_sendfile(tmp_path, monkeypatch):
+    real_sendfile = os.sendfile
+    calls = []
+
+    def sendfile_once(out_fd, in_fd, offset, count):
+        if calls:
+            raise OSError(errno.EINVAL, "not supported")
+        calls.append(offset)
+        return real_sendfile(out_fd, in_fd, offset, count)
+
+    monkeypatch.setattr(os, 'splice', unsupported, raising=False)
+    monkeypatch.setattr(os, 'sendfile', sendfile_once)
+    assert copy_through_pipe(tmp_path) == (len(DATA), DATA)
+
+
+def test_buffer_size_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        copy_through_pipe(tmp_path, buffer_size=0)
+    with pytest.raises(ValueError):
+        run_with_stdin_file([sys.executable, '-c', 'pass'], buffer_size=0)
+
+
+def write_stdin_to(path):
+    return [sys.executable, '-c', f"import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open({str(path)!r}, 'wb'))"]
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_run_with_stdin_file_wraps_dump(tmp_path, compressed):
+    dump = tmp_path / ('dump.sql.gz' if compressed else 'dump.sql')
+    if compressed:
+        with gzip.open(dump, 'wb') as f:
+            f.write(DATA)
+    else:
+        dump.write_bytes(DATA)
+    received = tmp_path / 'received'
+    returncode, stderr = run_with_stdin_file(
+        write_stdin_to(received), str(dump), prefix=b'BEGIN;\n', suffix=b'\nCOMMIT;\n', buffer_size=4096
+    )
+    assert returncode == 0
+    assert received.read_bytes() == b'BEGIN;\n' + DATA + b'\nCOMMIT;\n'
+
+
+def test_run_with_stdin_file_keeps_error_tail(tmp_path):
+    dump = tmp_path / 'dump.sql'
+    dump.write_bytes(DATA)
+    cmd = [sys.executable, '-c', "import sys; sys.stderr.write('x' * 200000 + 'failed'); sys.exit(3)"]
+    returncode, stderr = run_with_stdin_file(cmd, str(dump))
+    assert returncode == 3
+    assert stderr.startswith('...') and stderr.endswith('failed')
+    assert len(stderr) == STDERR_TAIL + 3
+
+
+def test_run_to_file_compresses(tmp_path):
+    output = tmp_path / 'dump.sql.gz'
+    cmd = [sys.executable, '-c', "import sys; sys.stdout.write('SELECT 1;\\n' * 1000)"]
+    assert run_to_file(cmd, str(output), compresslevel=6) == (0, '')
+    with gzip.open(output, 'rb') as f:
+        assert f.read() == b'SELECT 1;\n' * 1000
@@ -0,0 +1,98 @@
+from configparser import ConfigParser
+from datetime import datetime
+
+import pytest
+from job_queue import PENDING, SKIPPED, SQLiteJobStore
+from scheduler import JOB_NAME, SLOT_FORMAT, BackupScheduler, WeeklySchedule
+
+
+class FakeBackupService:
+    def __init__(self, scheduler_settings=None):
+        self.config = ConfigParser()
+        self.config['Scheduler'] = scheduler_settings or {}
+        self.config_mtime = None
+        self.connection = object()
+
+    def predict_backup_duration(self):
+        return None
+
+
+def make_scheduler(tmp_path, **settings):
+    service = FakeBackupService({key: str(value) for key, value in settings.items()})
+    return BackupScheduler(service, SQLiteJobStore(str(tmp_path / 'jobs.db')))
+
+
+def slot(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M")
+
+
+def test_previous_and_next_slot():
+    schedule = WeeklySchedule(weekday=5, at="00:00")
+    # 2026-10-17 is a Saturday
+    assert schedule.previous_slot(slot("2026-10-19 12:00")) == slot("2026-10-17 00:00")
+    assert schedule.previous_slot(slot("2026-10-17 00:00")) == slot("2026-10-17 00:00")
+    assert schedule.previous_slot(slot("2026-10-16 23:59")) == slot("2026-10-10 00:00")
+    assert schedule.next_slot(slot("2026-10-17 00:00")) == slot("2026-10-24 00:00")
+
+
+def test_slots_between():
+    schedule = WeeklySchedule(weekday=5, at="00:00")
+    assert schedule.slots_between(slot("2026-10-03 00:00"), slot("2026-10-17 00:00")) == [
+        slot("2026-10-10 00:00"), slot("2026-10-17 00:00")
+    ]
+    assert schedule.slots_between(slot("2026-10-17 00:00"), slot("2026-10-23 23:59")) == []
+
+
+def jobs_by_slot(scheduler):
+    return {job['slot_time']: job['status'] for job in scheduler.get_jobs()}
+
+
+def test_first_start_records_anchor_without_running_it(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    scheduler.enqueue_due_slots(now=slot("2026-10-19 12:00"))
+    assert jobs_by_slot(scheduler) == {"2026-10-17 00:00:00": SKIPPED}
+
+
+@pytest.mark.parametrize('catch_up, now, expected', [
+    ('all', "2026-10-17 01:00", [PENDING, PENDING]),
+    ('latest', "2026-10-17 01:00", [SKIPPED, PENDING]),
+    ('skip', "2026-10-17 00:30", [SKIPPED, PENDING]),
+    ('skip', "2026-10-17 02:00", [SKIPPED, SKIPPED]),
+])
+def test_catch_up_policies(tmp_path, catch_up, now, expected):
+    scheduler = make_scheduler(tmp_path, catch_up=catch_up, misfire_grace=3600)
+    scheduler.store.enqueue(JOB_NAME, "2026-10-03 00:00:00", status=SKIPPED)
+    scheduler.enqueue_due_slots(now=slot(now))
+    jobs = jobs_by_slot(scheduler)
+    assert [jobs["2026-10-10 00:00:00"], jobs["2026-10-17 00:00:00"]] == expected
+
+
+def test_catch_up_staggers_jobs_beyond_capacity(tmp_path):
+    scheduler = make_scheduler(tmp_path, catch_up='all', capacity=1)
+    scheduler.backup_service.predict_backup_duration = lambda: 600
+    scheduler.store.enqueue(JOB_NAME, "2026-10-03 00:00:00", status=SKIPPED)
+    scheduler.enqueue_due_slots(now=slot("2026-10-17 01:00"))
+    run_after = sorted(job['run_after'] for job in scheduler.get_jobs() if job['status'] == PENDING)
+    assert run_after[1] - run_after[0] == 600
+
+
+@pytest.mark.parametrize('setting', ['capacity', 'lease_seconds', 'poll_interval', 'window_hours'])
+def test_non_positive_settings_are_rejected(tmp_path, setting):
+    with pytest.raises(ValueError, match=setting):
+        make_scheduler(tmp_path, **{setting: 0})
+
+
+def test_unknown_catch_up_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        make_scheduler(tmp_path, catch_up='sometimes')
+
+
+def test_scheduled_backup_is_named_after_its_slot(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    names = []
+    scheduler.run_scheduled_backup = lambda location, backup_name: (names.append(backup_name), (True, 'ok'))[1]
+    scheduler.store.enqueue(JOB_NAME, "2026-10-17 00:00:00")
+    [job] = scheduler.store.claim(scheduler.node_id, 1, 60)
+    scheduler._run_job(job)
+    assert names == ["scheduled_backup_20261017_0000"]
+    assert scheduler.get_jobs()[0]['status'] == 'done'